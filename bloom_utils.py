@@ -1,48 +1,154 @@
 # bloom_utils.py
+import functools
 import re
 
-def classify_bloom(question, answer):
-    question = question.lower()
-    answer = answer.lower()
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
-    # --- Detect Bloom level from question ---
-    if re.search(r'\b(define|list|name|identify|recall|state|who|what|when|where)\b', question):
-        question_level = "Remember"
-    elif re.search(r'\b(explain|describe|compare|contrast|summarize|interpret|paraphrase)\b', question):
-        question_level = "Understand"
-    elif re.search(r'\b(apply|use|demonstrate|illustrate|solve|implement|design)\b', question):
-        question_level = "Apply"
-    elif re.search(r'\b(analyze|differentiate|organize|attribute|distinguish|examine)\b', question):
-        question_level = "Analyze"
-    elif re.search(r'\b(evaluate|assess|critique|judge|justify|recommend)\b', question):
-        question_level = "Evaluate"
-    elif re.search(r'\b(create|design|construct|plan|produce|develop|formulate)\b', question):
-        question_level = "Create"
+# Hierarchy frozen as a tuple with a companion rank dict so level lookups
+# are O(1) dict hits rather than repeated list.index scans.
+BLOOM_IDX = {"Remember": 0, "Understand": 1, "Apply": 2, "Analyze": 3, "Evaluate": 4, "Create": 5}
+BLOOM_HIERARCHY = tuple(BLOOM_IDX)
+
+# All keyword groups are combined into one compiled pattern with a named
+# group per level, so classification is a single scan over the text
+# instead of one re.search per level. Group order matches the original
+# if/elif ladder so overlapping words (e.g. "design") resolve the same way.
+_QUESTION_PATTERN = re.compile(
+    r'\b(?:(?P<Remember>define|list|name|identify|recall|state|who|what|when|where)'
+    r'|(?P<Understand>explain|describe|compare|contrast|summarize|interpret|paraphrase)'
+    r'|(?P<Apply>apply|use|demonstrate|illustrate|solve|implement|design)'
+    r'|(?P<Analyze>analyze|differentiate|organize|attribute|distinguish|examine)'
+    r'|(?P<Evaluate>evaluate|assess|critique|judge|justify|recommend)'
+    r'|(?P<Create>create|design|construct|plan|produce|develop|formulate))\b',
+    re.IGNORECASE)
+
+# The "Remember" answer rule is conditional on answer length, so it stays
+# a separate pattern checked first.
+_ANSWER_REMEMBER_PATTERN = re.compile(r'\b(is|are|was|were|means)\b', re.IGNORECASE)
+
+_ANSWER_PATTERN = re.compile(
+    r'\b(?:(?P<Understand>because|since|as|consists of|includes)'
+    r'|(?P<Apply>can be used to|applied|implemented|designed|built)'
+    r'|(?P<Analyze>compared to|differs from|analysis|relationship|impact of|effect of)'
+    r'|(?P<Evaluate>better|worse|more effective|less efficient|advantages|disadvantages|pros|cons)'
+    r'|(?P<Create>new|novel|innovative|created|designed|developed|proposed))\b',
+    re.IGNORECASE)
+
+
+def _first_matching_level(pattern, text):
+    """Single pass over text; return the highest-priority level that matched."""
+    matched = {m.lastgroup for m in pattern.finditer(text)}
+    for level in BLOOM_HIERARCHY:
+        if level in matched:
+            return level
+    return None
+
+
+# Aho-Corasick automatons are cached per keyword tuple: the reference
+# keywords for a question are shared across every student answer, so the
+# automaton is built once and each answer is scanned in a single pass
+# instead of one substring search per keyword.
+_keyword_automatons = {}
+
+def _get_keyword_automaton(reference_keywords):
+    key = tuple(reference_keywords)
+    automaton = _keyword_automatons.get(key)
+    if automaton is None:
+        automaton = ahocorasick.Automaton()
+        for keyword in reference_keywords:
+            lowered = keyword.lower()
+            automaton.add_word(lowered, lowered)
+        automaton.make_automaton()
+        _keyword_automatons[key] = automaton
+    return automaton
+
+
+# Lowercased keyword lists are cached per tuple: lowering the keywords on
+# every call (and the student text once per keyword, as the original code
+# did) re-allocates the same strings for every student.
+_lowered_keywords_cache = {}
+
+def _lowered_keywords(reference_keywords):
+    key = tuple(reference_keywords)
+    lowered = _lowered_keywords_cache.get(key)
+    if lowered is None:
+        lowered = [keyword.lower() for keyword in reference_keywords]
+        _lowered_keywords_cache[key] = lowered
+    return lowered
+
+
+# Compiled keyword-union patterns, cached per keyword tuple, for the
+# regex fallback when pyahocorasick is unavailable. Alternatives are
+# sorted longest-first so longer keywords aren't shadowed by prefixes.
+_keyword_pattern_cache = {}
+
+def _keyword_pattern(reference_keywords):
+    key = tuple(reference_keywords)
+    pattern = _keyword_pattern_cache.get(key)
+    if pattern is None:
+        alternatives = sorted(_lowered_keywords(reference_keywords), key=len, reverse=True)
+        pattern = re.compile("|".join(re.escape(keyword) for keyword in alternatives))
+        _keyword_pattern_cache[key] = pattern
+    return pattern
+
+
+def find_keywords(student_text, reference_keywords):
+    """Return the set of lowercased reference keywords found in the text.
+
+    One pass over the text (Aho-Corasick when available, otherwise a
+    compiled regex union); keywords the scan missed get an individual
+    substring check so overlapping keywords are still detected.
+    """
+    if not reference_keywords:
+        return set()
+    text_lower = student_text.lower()
+    if ahocorasick is not None:
+        automaton = _get_keyword_automaton(reference_keywords)
+        found = {value for _, value in automaton.iter(text_lower)}
     else:
-        question_level = None
+        found = set(_keyword_pattern(reference_keywords).findall(text_lower))
+    return {
+        keyword for keyword in _lowered_keywords(reference_keywords)
+        if keyword in found or keyword in text_lower
+    }
+
+
+def missing_keywords(student_text, reference_keywords):
+    """Return the reference keywords (original casing) absent from the text."""
+    found = find_keywords(student_text, reference_keywords)
+    return [
+        keyword for keyword, lowered
+        in zip(reference_keywords, _lowered_keywords(reference_keywords))
+        if lowered not in found
+    ]
+
+
+def keyword_coverage_score(student_text, reference_keywords):
+    """Fraction of reference keywords present in the student text."""
+    if not reference_keywords:
+        return 1.0
+    found = find_keywords(student_text, reference_keywords)
+    matches = sum(1 for keyword in _lowered_keywords(reference_keywords) if keyword in found)
+    return matches / len(reference_keywords)
+
+
+@functools.lru_cache(maxsize=4096)
+def classify_bloom(question, answer):
+    # --- Detect Bloom level from question ---
+    question_level = _first_matching_level(_QUESTION_PATTERN, question)
 
     # --- Detect Bloom level from answer ---
-    if re.search(r'\b(is|are|was|were|means)\b', answer) and len(answer.split()) < 20:
+    if _ANSWER_REMEMBER_PATTERN.search(answer) and len(answer.split()) < 20:
         answer_level = "Remember"
-    elif re.search(r'\b(because|since|as|consists of|includes)\b', answer):
-        answer_level = "Understand"
-    elif re.search(r'\b(can be used to|applied|implemented|designed|built)\b', answer):
-        answer_level = "Apply"
-    elif re.search(r'\b(compared to|differs from|analysis|relationship|impact of|effect of)\b', answer):
-        answer_level = "Analyze"
-    elif re.search(r'\b(better|worse|more effective|less efficient|advantages|disadvantages|pros|cons)\b', answer):
-        answer_level = "Evaluate"
-    elif re.search(r'\b(new|novel|innovative|created|designed|developed|proposed)\b', answer):
-        answer_level = "Create"
     else:
-        answer_level = "Understand"
+        answer_level = _first_matching_level(_ANSWER_PATTERN, answer) or "Understand"
 
     # --- Resolve final Bloom level ---
-    bloom_hierarchy = ["Remember", "Understand", "Apply", "Analyze", "Evaluate", "Create"]
     if question_level and answer_level:
-        q_idx = bloom_hierarchy.index(question_level)
-        a_idx = bloom_hierarchy.index(answer_level)
-        return bloom_hierarchy[max(q_idx, a_idx)]
+        return BLOOM_HIERARCHY[max(BLOOM_IDX[question_level], BLOOM_IDX[answer_level])]
     elif answer_level:
         return answer_level
     elif question_level:
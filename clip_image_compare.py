@@ -1,48 +1,113 @@
-# clip_image_compare.py
-"""
-CLIP image similarity utility.
-
-Install dependencies before running:
-pip install torch torchvision ftfy regex tqdm
-pip install git+https://github.com/openai/CLIP.git
-pip install pillow scikit-learn
-
-Example:
-python clip_image_compare.py --img1 check.png --img2 check.jpg
-"""
-
-import argparse
-import torch
-import clip
-from PIL import Image
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import sys
-import os
-
-# Load model and preprocessing
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model, preprocess = clip.load("ViT-B/32", device=device)
-
-def get_clip_embedding(image_path):
-    """Load image, preprocess and return CLIP image embedding as a numpy array."""
-    if not os.path.isfile(image_path):
-        raise FileNotFoundError(f"Image not found: {image_path}")
-
-    # Open image and ensure conversion to RGB
-    with Image.open(image_path) as img:
-        img = img.convert("RGB")
-        image_tensor = preprocess(img).unsqueeze(0).to(device)
-
-    with torch.no_grad():
-        embedding = model.encode_image(image_tensor)
-        # normalize embedding to unit vector for cosine similarity stability
-        embedding = embedding / embedding.norm(dim=-1, keepdim=True)
-    return embedding.cpu().numpy()
-
-def compare_images(img1_path, img2_path):
-    """Return cosine similarity between two images using CLIP embeddings."""
-    emb1 = get_clip_embedding(img1_path)
-    emb2 = get_clip_embedding(img2_path)
-    similarity = cosine_similarity(emb1, emb2)[0][0]
-    return float(similarity)
+# clip_image_compare.py
+"""
+CLIP image similarity utility.
+
+Install dependencies before running:
+pip install torch torchvision ftfy regex tqdm
+pip install git+https://github.com/openai/CLIP.git
+pip install pillow
+
+Example:
+python clip_image_compare.py --img1 check.png --img2 check.jpg
+"""
+
+import argparse
+import functools
+import hashlib
+import torch
+import clip
+from PIL import Image
+import numpy as np
+import sys
+import os
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+@functools.lru_cache(maxsize=None)
+def get_clip():
+    """Load (once, on first use) the CLIP model and preprocessing transform.
+
+    Deferring the ~350 MB weight load keeps importing this module cheap
+    for callers that never touch images.
+    """
+    model, preprocess = clip.load("ViT-B/32", device=device)
+    # clip.load already casts to FP16 on CUDA. Compiling the vision tower
+    # trims per-call Python/kernel-launch overhead; older torch builds or
+    # unsupported backends silently keep the eager model.
+    try:
+        model.visual = torch.compile(model.visual, mode='reduce-overhead')
+    except Exception:
+        pass
+    return model, preprocess
+
+# Embeddings are cached per (path, mtime): in-process for the current
+# run, and as .npy files under embeddings_cache/ so reference images keep
+# their embeddings across runs. Cache hits skip the ViT forward entirely.
+EMBED_CACHE_DIR = "embeddings_cache"
+_embedding_cache = {}
+
+def _cache_key(image_path):
+    return (image_path, os.path.getmtime(image_path))
+
+def _disk_cache_path(image_path):
+    digest = hashlib.sha1(f"{image_path}:{os.path.getmtime(image_path)}".encode()).hexdigest()
+    return os.path.join(EMBED_CACHE_DIR, digest + ".npy")
+
+def _load_from_disk(image_path):
+    try:
+        return np.load(_disk_cache_path(image_path))
+    except (OSError, ValueError):
+        return None
+
+def _save_to_disk(image_path, embedding):
+    try:
+        os.makedirs(EMBED_CACHE_DIR, exist_ok=True)
+        np.save(_disk_cache_path(image_path), embedding)
+    except OSError:
+        pass
+
+def clip_embed_batch(image_paths):
+    """Embed many images in a single forward pass.
+
+    Returns an (N, D) array of L2-normalized embeddings aligned with
+    image_paths. Already-cached images skip preprocessing and inference.
+    """
+    missing = []
+    for path in dict.fromkeys(image_paths):
+        # Validate before _cache_key: a missing file would otherwise
+        # surface as a raw getmtime error instead of this message.
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Image not found: {path}")
+        if _cache_key(path) in _embedding_cache:
+            continue
+        cached = _load_from_disk(path)
+        if cached is not None:
+            _embedding_cache[_cache_key(path)] = cached
+        else:
+            missing.append(path)
+    if missing:
+        model, preprocess = get_clip()
+        tensors = []
+        for path in missing:
+            with Image.open(path) as img:
+                tensors.append(preprocess(img.convert("RGB")))
+        batch = torch.stack(tensors).to(device)
+        with torch.no_grad():
+            embeddings = model.encode_image(batch)
+            embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+        embeddings = embeddings.cpu().numpy()
+        for path, emb in zip(missing, embeddings):
+            _embedding_cache[_cache_key(path)] = emb
+            _save_to_disk(path, emb)
+    return np.stack([_embedding_cache[_cache_key(p)] for p in image_paths])
+
+def get_clip_embedding(image_path):
+    """Load image, preprocess and return CLIP image embedding as a numpy array."""
+    return clip_embed_batch([image_path])[:1]
+
+def compare_images(img1_path, img2_path):
+    """Return cosine similarity between two images using CLIP embeddings."""
+    # Embeddings are already L2-normalized, so cosine similarity reduces
+    # to a dot product; no need for sklearn's validation and broadcasting.
+    emb1, emb2 = clip_embed_batch([img1_path, img2_path])
+    return float((emb1 * emb2).sum())
@@ -0,0 +1,49 @@
+# json_utils.py
+"""Shared JSON load/dump helpers.
+
+Uses orjson (C encoder/decoder) when installed and falls back to the
+stdlib so the optional dependency stays optional in one place instead
+of per-module try/except blocks.
+"""
+
+import json
+import mmap
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def load_json(path):
+    """Parse a JSON file from a read-only mmap of its bytes.
+
+    Mapping the file lets the parser read the page cache directly
+    instead of first copying the payload into a Python bytes object;
+    empty files (which cannot be mapped) fall back to a plain read.
+    """
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if orjson is not None:
+                    return orjson.loads(memoryview(mm))
+                return json.loads(mm.read())
+        except ValueError:
+            data = f.read()
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dump_json(obj, path, indent=False):
+    """Write obj to path as JSON; indent=True for human-read artifacts."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=option))
+    elif indent:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, separators=(",", ":"), ensure_ascii=False)
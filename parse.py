@@ -1,9 +1,10 @@
 import os
 import base64
 import json
-import re
 import google.generativeai as genai
 from PIL import Image
+
+from json_utils import dump_json
 import time
 import io
 
@@ -21,15 +22,18 @@ image_path = "answer.png"
 print(f"[DEBUG] Loading image: {image_path}")
 start_time = time.time()
 img = Image.open(image_path)
-img = img.convert("RGB")
 
 # Resize if image is too large (to avoid response truncation)
 max_dimension = 2048
+# For JPEG inputs, draft() asks the decoder for a DCT-level downscale so
+# pixels the resize would discard are never decoded in the first place.
+if img.format == "JPEG":
+    img.draft("RGB", (max_dimension, max_dimension))
+if img.mode != "RGB":
+    img = img.convert("RGB")
 if img.width > max_dimension or img.height > max_dimension:
-    ratio = min(max_dimension / img.width, max_dimension / img.height)
-    new_size = (int(img.width * ratio), int(img.height * ratio))
-    img = img.resize(new_size, Image.Resampling.LANCZOS)
-    print(f"[DEBUG] Image resized to {new_size}")
+    img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    print(f"[DEBUG] Image resized to {img.size}")
 
 print(f"[DEBUG] Image loaded in {time.time() - start_time:.2f}s")
 
@@ -38,9 +42,12 @@ print(f"[DEBUG] Image loaded in {time.time() - start_time:.2f}s")
 # ----------------------------
 print("[DEBUG] Encoding image to Base64")
 start_time = time.time()
-buffer = io.BytesIO()
-img.save(buffer, format="JPEG", quality=85)
-img_b64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
+# getbuffer() hands base64 a zero-copy view of the JPEG payload where
+# getvalue() would duplicate it first; base64 output is pure ASCII so
+# the decode never needs UTF-8 validation.
+with io.BytesIO() as buffer:
+    img.save(buffer, format="JPEG", quality=85)
+    img_b64 = base64.b64encode(buffer.getbuffer()).decode("ascii")
 print(f"[DEBUG] Image encoded in {time.time() - start_time:.2f}s, size: {len(img_b64)/1024:.2f} KB")
 
 # ----------------------------
@@ -93,18 +100,58 @@ except Exception as e:
 # ----------------------------
 # 6. Extract JSON from response
 # ----------------------------
+def _longest_valid_prefix(s):
+    """Longest parseable prefix of a (possibly truncated) JSON object.
+
+    Linear scan tracking brace depth and string/escape state; if the
+    outer object never closes, the scan falls back to the last complete
+    top-level entry and closes the object there. Replaces a DOTALL
+    regex whose nested wildcards could backtrack catastrophically on
+    large truncated responses.
+    """
+    depth = 0
+    in_str = False
+    esc = False
+    last_entry_end = -1
+    for i, c in enumerate(s):
+        if in_str:
+            if esc:
+                esc = False
+            elif c == '\\':
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                return s[:i + 1]
+            if depth == 1:
+                last_entry_end = i
+    if last_entry_end >= 0:
+        return s[:last_entry_end + 1] + '}'
+    return ''
+
+
 def extract_json_from_response(text):
     """Extract JSON from markdown code blocks or raw text"""
-    # Remove markdown code blocks
-    text = re.sub(r'```(?:json)?\s*', '', text)
-    text = re.sub(r'```\s*$', '', text)
-    
-    # Try to find JSON object
-    json_match = re.search(r'\{.*\}', text, re.DOTALL)
-    if json_match:
-        return json_match.group(0)
-    
-    return text.strip()
+    # raw_decode parses the first valid object from the first brace in one
+    # linear pass: no DOTALL backtracking over the whole response, markdown
+    # fences fall outside the matched span, and '}' inside string values
+    # can't truncate the match the way the old greedy regex could.
+    start = text.find('{')
+    if start < 0:
+        return text.strip()
+    try:
+        _, end = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        # Truncated/invalid object: hand back the tail so the caller's
+        # brace-count warning and salvage path still see it.
+        return text[start:].strip()
+    return text[start:end]
 
 print("[DEBUG] Extracting and parsing JSON output")
 try:
@@ -131,14 +178,10 @@ except json.JSONDecodeError as e:
     
     # Try to salvage partial data
     print("\n[DEBUG] Attempting to salvage partial data...")
-    try:
-        # Find the last complete question entry
-        truncated_match = re.search(r'\{.*"q\d+".*?\}(?=\s*,?\s*"q\d+"|\s*\})', json_text, re.DOTALL)
-        if truncated_match:
-            print("[DEBUG] Found partial valid JSON, saving what we can...")
-    except:
-        pass
-    
+    salvaged = _longest_valid_prefix(json_text)
+    if salvaged:
+        print("[DEBUG] Found partial valid JSON, saving what we can...")
+
     exit(1)
 except Exception as e:
     print(f"❌ Error: {e}")
@@ -149,8 +192,7 @@ except Exception as e:
 # 7. Save JSON output
 # ----------------------------
 output_file = "ocr_output.json"
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(parsed_json, f, ensure_ascii=False, indent=2)
+dump_json(parsed_json, output_file, indent=True)
 print(f"[DEBUG] ✓ JSON output saved to {output_file}")
 
 # ----------------------------